@@ -2,11 +2,13 @@ import json
 import logging
 import os
 import shutil
+import statistics
 import time
 import urllib3
 
+from email.utils import parsedate_to_datetime
 from requests.utils import requote_uri
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 _logfile = "ccapi.log"
 
@@ -274,13 +276,31 @@ class CCAPI(object):
     def getTVAbility(self, maxTV):
         tvs = self.tv['ability']
         retVal = []
-        maxTV = self._convertFloat(maxTV.replace('"', ".").rstrip("."))
+        maxTV = self.tvToSeconds(maxTV)
         for tv in tvs:
-            if self._convertFloat(tv.replace('"', ".").rstrip(".")) <= float(maxTV):
+            if self.tvToSeconds(tv) <= float(maxTV):
                 retVal.append(tv)
         return retVal
     # end getISOAbility
 
+    def tvToSeconds(self, tv: str) -> float:
+        """
+        Helper Function to convert a TV string (e.g. 1/250, 0"5, 3") to the exposure time in seconds
+        :param tv: The TV string as reported by the camera
+        :return: The exposure time in seconds
+        """
+        return self._convertFloat(tv.replace('"', ".").rstrip("."))
+    # end tvToSeconds
+
+    def aebToStops(self, aeb: str) -> float:
+        """
+        Helper Function to convert an AEB string (e.g. +-1_1/3) to the bracket spacing in stops
+        :param aeb: The AEB string as reported by the camera
+        :return: The number of stops between each frame of the bracket
+        """
+        return self._convertFloat(aeb.lstrip("+-").replace("_", " "))
+    # end aebToStops
+
     def shoot(self, af=True):
         if self._DryRun == True:
             self._log.info(f"Dry Run Photo with TV: {self.tv['value']}, ISO: {self.iso['value']}")
@@ -291,6 +311,94 @@ class CCAPI(object):
             success = self._PostCamera(url=url, data=dataValue)
         return success
 
+    def shootBracket(self, holdTime, af=False):
+        """
+        Holds the shutter button down for the given time so that the camera, when set to a continuous drive
+        mode with AEB enabled, captures the full bracket from a single request.
+        :param holdTime: The number of seconds to hold the shutter button down
+        :param af: A boolean indicating if auto focus should be performed
+        :return: A boolean indicating if the shutter was pressed and released successfully
+        """
+        if self._DryRun == True:
+            self._log.info(f"Dry Run Bracket with TV: {self.tv['value']}, ISO: {self.iso['value']}, "
+                           f"AEB: {self.aeb['value']}")
+            success = True
+        else:
+            url = f"{self._IPAddress}/ccapi/ver100/shooting/control/shutterbutton/manual"
+            success = self._PostCamera(url=url, data={"action": "full_press", "af": af})
+            if success:
+                time.sleep(holdTime)
+            else:
+                self._log.warning("Shutter press failed, not holding for the bracket")
+            # Always attempt the release so the shutter is not left held down
+            released = self._PostCamera(url=url, data={"action": "release", "af": af})
+            success = success and released
+        return success
+    # end shootBracket
+
+    @property
+    def aeb(self):
+        """
+        Getter for the Auto Exposure Bracketing (a.k.a. AEB) setting
+        :return:
+        """
+        url = f"{self._IPAddress}/ccapi/ver100/shooting/settings/aeb"
+        data = self._GetCamera(url)
+        self._log.debug(f"Camera AEB Setting {data}")
+        return data
+    # end aeb
+
+    @aeb.setter
+    def aeb(self, value):
+        """
+        Setter for the Auto Exposure Bracketing (a.k.a. AEB) setting
+        :param value:
+        :return:
+        """
+        ability = self.aeb["ability"]
+
+        if str(value) in ability:
+            self._log.info(f"Setting AEB to {value}")
+            url = f"{self._IPAddress}/ccapi/ver100/shooting/settings/aeb"
+            dataValue = {"value": str(value)}
+            data = self._PutCamera(url=url, data=dataValue)
+        else:
+            self._log.warning(f"Unable to set AEB Value {value} not within {ability}")
+            data = None
+        return data
+    # end aeb
+
+    @property
+    def drive(self):
+        """
+        Getter for the Drive Mode (e.g. single, highspeedcontinuous)
+        :return:
+        """
+        url = f"{self._IPAddress}/ccapi/ver100/shooting/settings/drive"
+        data = self._GetCamera(url)
+        self._log.debug(f"Camera Drive Setting {data}")
+        return data
+    # end drive
+
+    @drive.setter
+    def drive(self, value):
+        """
+        Setter for the Drive Mode
+        :param value:
+        :return:
+        """
+        ability = self.drive["ability"]
+
+        if str(value) in ability:
+            self._log.info(f"Setting Drive Mode to {value}")
+            url = f"{self._IPAddress}/ccapi/ver100/shooting/settings/drive"
+            dataValue = {"value": str(value)}
+            data = self._PutCamera(url=url, data=dataValue)
+        else:
+            self._log.warning(f"Unable to set Drive Value {value} not within {ability}")
+            data = None
+        return data
+    # end drive
 
     @property
     def tv(self):
@@ -355,6 +463,134 @@ class CCAPI(object):
             data = None
         return data
 
+    @property
+    def cameraTime(self):
+        """
+        Getter for the camera date and time setting
+        :return:
+        """
+        url = f"{self._IPAddress}/ccapi/ver100/functions/datetime"
+        data = self._GetCamera(url)
+        self._log.debug(f"Camera Date Time Setting {data}")
+        return data
+    # end cameraTime
+
+    def getClockOffset(self, samples=5, timeout=3):
+        """
+        Estimates the offset between the camera clock and the host clock.  The camera only reports whole seconds,
+        so the camera clock is polled until the second ticks over, placing the tick between two polls.
+        :param samples: The number of second ticks to average the offset over
+        :param timeout: The number of seconds to wait for each tick before giving up on the sample
+        :return: The number of seconds the camera clock is ahead of the host clock, or None when no tick was seen
+        """
+        offsets = []
+        for _ in range(samples):
+            previous = None
+            giveUp = time.monotonic() + timeout
+            while time.monotonic() < giveUp:
+                before = datetime.now(timezone.utc)
+                data = self.cameraTime
+                after = datetime.now(timezone.utc)
+                if data is None:
+                    continue
+
+                hostTime = before + (after - before) / 2
+                cameraTime = parsedate_to_datetime(data['datetime'])
+                if previous is not None and cameraTime - previous[1] == timedelta(seconds=1):
+                    tickTime = previous[0] + (hostTime - previous[0]) / 2
+                    offsets.append((cameraTime - tickTime).total_seconds())
+                    break
+                # A slow poll can miss a whole second, which is not a usable tick, so keep polling
+                previous = (hostTime, cameraTime)
+            # end while
+        # end for
+
+        if len(offsets) == 0:
+            self._log.warning("Unable to estimate the camera clock offset")
+            retVal = None
+        else:
+            retVal = statistics.median(offsets)
+            self._log.info(f"Camera Clock Offset: {retVal:.3f}s from {len(offsets)} samples")
+        return retVal
+    # end getClockOffset
+
+    def measureShutterLatency(self, clockOffset, samples=5, timeout=10, pollDelay=0.2, removeAfterMeasure=True):
+        """
+        Measures the delay between POSTing the shutter button and the exposure being captured, using the
+        timestamp of the new file on the camera.  File timestamps are whole seconds, so each sample only bounds
+        the latency to a one second interval.  Sample k is pressed k/samples of the way through the camera
+        second so the intervals are offset from each other, and their intersection bounds the latency to
+        roughly +/- 1/(2 * samples) seconds.  A skipped sample breaks the even spread, and latency jitter near an
+        interval edge shifts the intersection, so the estimate can then be off by more than 1/(2 * samples).
+        :param clockOffset: The number of seconds the camera clock is ahead of the host clock
+        :param samples: The number of test photos to take
+        :param timeout: The number of seconds to wait for each new file to appear on the camera
+        :param pollDelay: The number of seconds to wait between checks for the new file
+        :param removeAfterMeasure: A boolean indicating if the test photos should be deleted from the camera
+        :return: A tuple of the latency and its uncertainty in seconds, or None when no sample was measured
+        """
+        lower = []
+        upper = []
+        for k in range(samples):
+            known = self.getDeviceStorage()
+            if known is None:
+                self._log.warning("Unable to list the camera storage, skipping sample")
+                continue
+
+            # Wait for the press to fall k/samples of the way into the next camera second
+            cameraNow = time.time() + clockOffset
+            pressAt = int(cameraNow) + 1 + k / samples - clockOffset
+            time.sleep(max(0.0, pressAt - time.time()))
+
+            start = time.time()
+            if not self.shoot(af=False):
+                self._log.warning("Calibration photo failed, skipping sample")
+                continue
+
+            newFiles = []
+            giveUp = time.monotonic() + timeout
+            while len(newFiles) == 0 and time.monotonic() < giveUp:
+                time.sleep(pollDelay)
+                files = self.getDeviceStorage()
+                if files is not None:
+                    newFiles = [f for f in files if f not in known]
+            # end while
+
+            if len(newFiles) == 0:
+                self._log.warning("No new file found for calibration photo, skipping sample")
+                continue
+
+            # Poll once more so the second file of a RAW+JPEG pair is also found and removed
+            time.sleep(pollDelay)
+            files = self.getDeviceStorage()
+            if files is not None:
+                newFiles += [f for f in files if f not in known and f not in newFiles]
+
+            info = self._GetCamera(f"{self._IPAddress}{newFiles[0]}?kind=info")
+            if info is not None:
+                # The capture happened within the whole second of the timestamp
+                captured = parsedate_to_datetime(info['lastmodifieddate']).timestamp()
+                pressed = start + clockOffset
+                lower.append(captured - pressed)
+                upper.append(captured + 1 - pressed)
+                self._log.debug(f"Shutter Latency Sample: {lower[-1]:.3f}s to {upper[-1]:.3f}s")
+
+            if removeAfterMeasure:
+                for f in newFiles:
+                    self.deleteFile(f)
+        # end for
+
+        if len(lower) == 0:
+            retVal = None
+        elif max(lower) < min(upper):
+            retVal = ((max(lower) + min(upper)) / 2, (min(upper) - max(lower)) / 2)
+        else:
+            # The latency jitter is larger than the spread of the press times, so the intervals do not overlap
+            self._log.warning("Shutter Latency samples do not overlap, using the mean of the samples")
+            retVal = ((statistics.mean(lower) + statistics.mean(upper)) / 2, 0.5)
+        return retVal
+    # end measureShutterLatency
+
     def getDeviceInformation(self):
         url = f"{self._CCURL}/ver100/deviceinformation"
         data = self._GetBDAPI(url)
@@ -368,9 +604,9 @@ class CCAPI(object):
         # url = f"{self._IPAddress}{cardPath}"
         # data = self._GetCamera(url)
         url = f"{self._IPAddress}/ccapi/ver110/contents/card1/100CANON"
-        data = self._GetCamera(url)['path']
+        data = self._GetCamera(url)
 
-        return data
+        return None if data is None else data['path']
 
 
 # end CCAPI
@@ -19,6 +19,9 @@ class EclipseCanon(object):
         self._C3 = datetime.strptime(cfg['Eclipse']['c3'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
         self._C4 = datetime.strptime(cfg['Eclipse']['c4'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
         self._Max = datetime.strptime(cfg['Eclipse']['max'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+        # Measured by calibrate(), zero until the camera has been calibrated
+        self._ShutterLead = 0.0
     # end __init__
 
     def _EnableDebugMode(self):
@@ -76,6 +79,90 @@ class EclipseCanon(object):
         return wake
     # end getWakeTime
 
+    def getTriggerTime(self, target):
+        """
+        Leads the given target time by the measured shutter latency so the exposure lands on the target
+        :param target: The time the exposure should be captured at
+        :return: The time the shutter button should be pressed
+        """
+        return target - timedelta(seconds=self._ShutterLead)
+    # end getTriggerTime
+
+    def calibrate(self, ccapi, samples=5, maxLead=2.0):
+        """
+        Measures the host to camera clock offset and the shutter latency, taking test photos on the camera.
+        The measured latency is used to lead the shots timed to the contacts.
+        :param ccapi: The CCAPI connection to the camera
+        :param samples: The number of samples to take for each measurement
+        :param maxLead: The largest latency in seconds accepted as a lead, larger values are rejected
+        :return: A boolean indicating if the calibration was successful
+        """
+        clockOffset = ccapi.getClockOffset(samples=samples)
+        if clockOffset is None:
+            return False
+
+        latency = ccapi.measureShutterLatency(clockOffset=clockOffset, samples=samples)
+        if latency is None:
+            self._log.warning("Unable to measure the shutter latency, shots will not be led")
+            return False
+
+        lead, uncertainty = latency
+        self._log.info(f"Shutter Latency: {lead:.3f}s +/- {uncertainty:.3f}s")
+
+        if lead < 0.0 or lead > maxLead:
+            self._log.warning(f"Shutter Latency {lead:.3f}s outside of 0 to {maxLead}s, shots will not be led")
+            return False
+
+        self._ShutterLead = lead
+        return True
+    # end calibrate
+
+    def getBracketCenters(self, tvs, aebStops, frames):
+        """
+        Selects the TV values to use as the center of each AEB bracket so that the brackets tile the given
+        TV list end to end.  Assumes the TV list is in 1/3 stop increments as reported by the camera.
+        :param tvs: The list of TV values available for the walk
+        :param aebStops: The number of stops between each frame of the bracket
+        :param frames: The number of frames captured per bracket (3, 5 or 7)
+        :return: The list of TV values to center the brackets on
+        """
+        step = int(round(aebStops * 3))
+        halfSpan = step * (frames - 1) // 2
+        lastIndex = len(tvs) - 1
+
+        retVal = []
+        if step <= 0:
+            self._log.warning(f"AEB spacing of {aebStops} stops does not bracket, no bracket centers selected")
+            return retVal
+        if lastIndex < 2 * halfSpan:
+            self._log.warning(f"Only {len(tvs)} TV values available, too few for a {frames} frame bracket "
+                              f"at {aebStops} stops, no bracket centers selected")
+            return retVal
+
+        index = halfSpan
+        while index - halfSpan <= lastIndex:
+            center = tvs[min(index, lastIndex - halfSpan)]
+            if center not in retVal:
+                retVal.append(center)
+            index += step * frames
+
+        return retVal
+    # end getBracketCenters
+
+    def getBracketHoldTime(self, center, aebStops, frames, frameDelay):
+        """
+        Computes how long the shutter must be held to capture every frame of a bracket
+        :param center: The exposure time in seconds of the center frame
+        :param aebStops: The number of stops between each frame of the bracket
+        :param frames: The number of frames captured per bracket (3, 5 or 7)
+        :param frameDelay: Additional seconds allowed per frame for the shutter and card writes
+        :return: The number of seconds to hold the shutter button down
+        """
+        halfFrames = (frames - 1) // 2
+        exposure = sum(center * 2 ** (k * aebStops) for k in range(-halfFrames, halfFrames + 1))
+        return exposure + frames * frameDelay
+    # end getBracketHoldTime
+
 
 def setupLogging(verbose: bool,
                  logFile: str) -> logging.Logger:
@@ -157,6 +244,10 @@ if __name__ == "__main__":
         log.error("Missing Configuration setting from configuration file")
     elif cfg['Configuration'] == "Walk":
         log.info("Walk Configuration")
+        if cfg.get('Calibration', {}).get('Enabled', False):
+            log.info("Calibrating Camera Clock Offset and Shutter Latency")
+            ec.calibrate(ccapi, samples=cfg['Calibration']['Samples'], maxLead=cfg['Calibration']['MaxLead'])
+
         while ec.getPhase() == "PRE":
             wake = ec.getWakeTime()
             log.info(f"Waiting for C1 at {wake}")
@@ -184,14 +275,86 @@ if __name__ == "__main__":
         ##################################
         ccapi.iso = cfg['Walk']['BeadsISO']
         ccapi.tv = cfg['Walk']['BeadsShutter']
-        while ec.getPhase() == "BEADS":
+        diamond = ec.getTriggerTime(ec._C2)
+        diamondSetup = timedelta(seconds=cfg['Walk']['DiamondSetup'])
+        shotTime = timedelta(0)
+        # Keep capturing Beads for as long as another shot still finishes before the Diamond Ring setup
+        while ec.getPhase() == "BEADS" and datetime.now(timezone.utc) + shotTime < diamond - diamondSetup:
             log.info(f"Capturing Beads at {datetime.now()}")
+            shotStart = datetime.now(timezone.utc)
+            ccapi.shoot(af=False)
+            shotTime = datetime.now(timezone.utc) - shotStart
+
+        ##################################
+        # Diamond Ring, led by the shutter latency to land on C2
+        ##################################
+        if datetime.now(timezone.utc) < diamond:
+            ccapi.tv = cfg['Walk']['DiamondShutter']
+            pause.until(diamond)
+            log.info(f"Capturing Diamond Ring at {datetime.now()}")
             ccapi.shoot(af=False)
 
+        # The Diamond Ring is pressed ahead of C2, wait for Totality before moving on
+        pause.until(ec._C2)
+
+        # Totality stops in time to set up the second Diamond Ring, led by the shutter latency to land on C3
+        diamond = ec.getTriggerTime(ec._C3)
+        totalityEnd = diamond - diamondSetup
+
         ##################################
         # C2 Settings (Totality)
         ##################################
-        while ec.getPhase() == "C2":
+        if cfg['Walk'].get('TotalityBracketing', False):
+            aebStops = ccapi.aebToStops(cfg['Walk']['BracketAEB'])
+            frames = cfg['Walk']['BracketFrames']
+            frameDelay = cfg['Walk']['BracketFrameDelay']
+
+            isos = ccapi.getISOAbility(maxISO=cfg['Walk']['MaxISO'])
+            log.info(f"ISO Capability: {isos}")
+            tvs = ccapi.getTVAbility(maxTV=str(cfg['Walk']['MaxShutter']))
+            log.info(f"TV Capability: {tvs}")
+            centers = ec.getBracketCenters(tvs, aebStops, frames)
+            log.info(f"Bracket Centers: {centers}")
+        else:
+            centers = []
+
+        if len(centers) > 0:
+            # Let the camera walk the TV around each center with AEB so each request yields a full bracket
+            previousDrive = ccapi.drive['value']
+            previousAEB = ccapi.aeb['value']
+            ccapi.drive = cfg['Walk']['BracketDrive']
+            ccapi.aeb = cfg['Walk']['BracketAEB']
+
+            # A rejected setting would hold the shutter for a burst of identical frames, so check both took
+            drive = ccapi.drive['value']
+            aeb = ccapi.aeb['value']
+            bracketing = drive == str(cfg['Walk']['BracketDrive']) and aeb == str(cfg['Walk']['BracketAEB'])
+            if not bracketing:
+                log.warning(f"Camera Drive: {drive}, AEB: {aeb} do not match the Bracket configuration, "
+                            f"using the single shot walk")
+
+            brackets = 0
+            while bracketing and ec.getPhase() == "C2" and brackets < len(isos) * len(centers):
+                iso = isos[brackets // len(centers)]
+                center = centers[brackets % len(centers)]
+                if brackets % len(centers) == 0:
+                    ccapi.iso = iso
+                holdTime = ec.getBracketHoldTime(ccapi.tvToSeconds(center), aebStops, frames, frameDelay)
+                if datetime.now(timezone.utc) + timedelta(seconds=holdTime) > totalityEnd:
+                    log.info(f"Bracket hold of {holdTime:.1f}s would run past the Diamond Ring, moving on")
+                    break
+                ccapi.tv = center
+
+                log.info(f"Capturing Totality Bracket at {datetime.now()} with Center TV: {center}   "
+                         f"ISO: {iso}")
+                ccapi.shootBracket(holdTime=holdTime, af=False)
+                brackets += 1
+
+            log.debug(f"Brackets Taken: {brackets}")
+            ccapi.aeb = previousAEB
+            ccapi.drive = previousDrive
+
+        while ec.getPhase() == "C2" and datetime.now(timezone.utc) < totalityEnd:
             isos = ccapi.getISOAbility(maxISO=800)
             log.info(f"ISO Capability: {isos}")
             tvs = ccapi.getTVAbility(maxTV='3"')
@@ -201,13 +364,14 @@ if __name__ == "__main__":
             for iso in isos:
                 ccapi.iso = iso
                 for tv in tvs:
+                    shotEnd = datetime.now(timezone.utc) + timedelta(seconds=ccapi.tvToSeconds(tv))
+                    if ec.getPhase() != "C2" or shotEnd > totalityEnd:
+                        log.info("Totality Ended moving on")
+                        break
                     ccapi.tv = tv
                     log.info(f"Capturing Totality at {datetime.now()} with Setting TV: {tv}   ISO: {iso}")
                     ccapi.shoot(af=False)
                     photos += 1
-                    if ec.getPhase() != "C2":
-                        log.info("Totality Ended moving on")
-                        break
                 else:
                     continue # Only executed if the loop did NOT break
                 break
@@ -219,6 +383,18 @@ if __name__ == "__main__":
 
             log.debug(f"Photos Taken: {photos}")
 
+        ##################################
+        # Diamond Ring, led by the shutter latency to land on C3
+        ##################################
+        if datetime.now(timezone.utc) < diamond:
+            ccapi.iso = cfg['Walk']['BeadsISO']
+            ccapi.tv = cfg['Walk']['DiamondShutter']
+            pause.until(diamond)
+            log.info(f"Capturing Diamond Ring at {datetime.now()}")
+            ccapi.shoot(af=False)
+
+        pause.until(ec._C3)
+
         ##################################
         # C3 Settings
         ##################################